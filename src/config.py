@@ -4,12 +4,17 @@ Reads settings from config/proxy_config.ini
 """
 
 import configparser
+import json
 import os
+from dataclasses import dataclass, fields
+from types import MappingProxyType
 
 CONFIG_FILE = "config/proxy_config.ini"
+CACHE_FILE_NAME = ".proxy_config.cache"
+CACHE_VERSION = 1  # Bump when _parse() changes how settings are read
 
-# Default configuration values
-DEFAULTS = {
+# Default configuration values (read-only)
+DEFAULTS = MappingProxyType({
     "host": "0.0.0.0",
     "port": 8888,
     "backlog": 50,
@@ -23,95 +28,209 @@ DEFAULTS = {
     "blocked_list": "config/blocked_domains.txt",
     "enable_filtering": True,
     "case_sensitive": False,
-    "buffer_size": 4096,
+    "buffer_size": 65536,
+    "socket_buffer_size": 0,
     "connect_timeout": 10,
     "forward_body": True,
     "enable_https": True,
     "track_sizes": True,
     "detailed_errors": True,
-}
+})
 
-class ProxyConfig:
-    """Proxy server configuration container."""
+def _get(parser, section, option, default):
+    """Get string value from config or return default."""
+    # Check first instead of catching NoSectionError/NoOptionError:
+    # a missing option is the common case when the file is absent
+    if not parser.has_option(section, option):
+        return default
+    return parser.get(section, option)
 
-    def __init__(self, config_file=CONFIG_FILE):
-        """
-        Load configuration from file or use defaults.
 
-        Args:
-            config_file: Path to configuration file
-        """
-        self.config = configparser.ConfigParser()
+def _get_int(parser, section, option, default):
+    """Get integer value from config or return default."""
+    if not parser.has_option(section, option):
+        return default
+    try:
+        return parser.getint(section, option)
+    except ValueError:
+        return default
 
-        # Load from file if it exists
-        if os.path.exists(config_file):
-            self.config.read(config_file)
-        else:
-            print(f"[!] Warning: Config file {config_file} not found, using defaults")
 
+def _get_bool(parser, section, option, default):
+    """Get boolean value from config or return default."""
+    if not parser.has_option(section, option):
+        return default
+    try:
+        return parser.getboolean(section, option)
+    except ValueError:
+        return default
+
+
+def _parse(parser):
+    """
+    Extract settings from a ConfigParser.
+
+    Args:
+        parser: ConfigParser with the config file already read
+
+    Returns:
+        dict: Setting name to value, suitable for ProxyConfig(**settings)
+    """
+    return {
         # Server settings
-        self.host = self._get("server", "host", DEFAULTS["host"])
-        self.port = self._get_int("server", "port", DEFAULTS["port"])
-        self.backlog = self._get_int("server", "backlog", DEFAULTS["backlog"])
-        self.timeout = self._get_int("server", "timeout", DEFAULTS["timeout"])
+        "host": _get(parser, "server", "host", DEFAULTS["host"]),
+        "port": _get_int(parser, "server", "port", DEFAULTS["port"]),
+        "backlog": _get_int(parser, "server", "backlog", DEFAULTS["backlog"]),
+        "timeout": _get_int(parser, "server", "timeout", DEFAULTS["timeout"]),
 
         # Concurrency settings
-        self.max_connections = self._get_int("concurrency", "max_connections",
-                                             DEFAULTS["max_connections"])
+        "max_connections": _get_int(parser, "concurrency", "max_connections",
+                                    DEFAULTS["max_connections"]),
 
         # Logging settings
-        self.log_dir = self._get("logging", "log_dir", DEFAULTS["log_dir"])
-        self.log_file = self._get("logging", "log_file", DEFAULTS["log_file"])
-        self.max_log_size = self._get_int("logging", "max_log_size",
-                                          DEFAULTS["max_log_size"])
-        self.log_rotation_count = self._get_int("logging", "log_rotation_count",
-                                                DEFAULTS["log_rotation_count"])
-        self.log_level = self._get("logging", "log_level", DEFAULTS["log_level"])
+        "log_dir": _get(parser, "logging", "log_dir", DEFAULTS["log_dir"]),
+        "log_file": _get(parser, "logging", "log_file", DEFAULTS["log_file"]),
+        "max_log_size": _get_int(parser, "logging", "max_log_size",
+                                 DEFAULTS["max_log_size"]),
+        "log_rotation_count": _get_int(parser, "logging", "log_rotation_count",
+                                       DEFAULTS["log_rotation_count"]),
+        "log_level": _get(parser, "logging", "log_level", DEFAULTS["log_level"]),
 
         # Filtering settings
-        self.blocked_list = self._get("filtering", "blocked_list",
-                                      DEFAULTS["blocked_list"])
-        self.enable_filtering = self._get_bool("filtering", "enable_filtering",
-                                               DEFAULTS["enable_filtering"])
-        self.case_sensitive = self._get_bool("filtering", "case_sensitive",
-                                             DEFAULTS["case_sensitive"])
+        "blocked_list": _get(parser, "filtering", "blocked_list",
+                             DEFAULTS["blocked_list"]),
+        "enable_filtering": _get_bool(parser, "filtering", "enable_filtering",
+                                      DEFAULTS["enable_filtering"]),
+        "case_sensitive": _get_bool(parser, "filtering", "case_sensitive",
+                                    DEFAULTS["case_sensitive"]),
 
         # Forwarding settings
-        self.buffer_size = self._get_int("forwarding", "buffer_size",
-                                         DEFAULTS["buffer_size"])
-        self.connect_timeout = self._get_int("forwarding", "connect_timeout",
-                                             DEFAULTS["connect_timeout"])
-        self.forward_body = self._get_bool("forwarding", "forward_body",
-                                           DEFAULTS["forward_body"])
+        "buffer_size": _get_int(parser, "forwarding", "buffer_size",
+                                DEFAULTS["buffer_size"]),
+        "socket_buffer_size": _get_int(parser, "forwarding",
+                                       "socket_buffer_size",
+                                       DEFAULTS["socket_buffer_size"]),
+        "connect_timeout": _get_int(parser, "forwarding", "connect_timeout",
+                                    DEFAULTS["connect_timeout"]),
+        "forward_body": _get_bool(parser, "forwarding", "forward_body",
+                                  DEFAULTS["forward_body"]),
 
         # Feature flags
-        self.enable_https = self._get_bool("features", "enable_https",
-                                           DEFAULTS["enable_https"])
-        self.track_sizes = self._get_bool("features", "track_sizes",
-                                          DEFAULTS["track_sizes"])
-        self.detailed_errors = self._get_bool("features", "detailed_errors",
-                                              DEFAULTS["detailed_errors"])
-
-    def _get(self, section, option, default):
-        """Get string value from config or return default."""
-        try:
-            return self.config.get(section, option)
-        except (configparser.NoSectionError, configparser.NoOptionError):
-            return default
-
-    def _get_int(self, section, option, default):
-        """Get integer value from config or return default."""
-        try:
-            return self.config.getint(section, option)
-        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
-            return default
-
-    def _get_bool(self, section, option, default):
-        """Get boolean value from config or return default."""
-        try:
-            return self.config.getboolean(section, option)
-        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
-            return default
+        "enable_https": _get_bool(parser, "features", "enable_https",
+                                  DEFAULTS["enable_https"]),
+        "track_sizes": _get_bool(parser, "features", "track_sizes",
+                                 DEFAULTS["track_sizes"]),
+        "detailed_errors": _get_bool(parser, "features", "detailed_errors",
+                                     DEFAULTS["detailed_errors"]),
+    }
+
+
+def _load_cache(cache_file, cache_key):
+    """
+    Load cached settings if they match the config file.
+    The cache is plain JSON, so a tampered file can at worst hold bad
+    values, never run code.
+
+    Returns:
+        dict: Cached settings, or None if missing, unreadable or stale
+    """
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # JSON turns tuples into lists, so compare against the key as stored
+    if (not isinstance(cached, dict)
+            or cached.get("key") != json.loads(json.dumps(cache_key))):
+        return None
+    settings = cached.get("settings")
+    return settings if isinstance(settings, dict) else None
+
+
+def _save_cache(cache_file, cache_key, settings):
+    """Save parsed settings to cache (best effort)."""
+    try:
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump({"key": cache_key, "settings": settings}, f)
+    except OSError:
+        pass
+
+
+@dataclass(frozen=True)
+class ProxyConfig:
+    """
+    Proxy server configuration container.
+    Immutable once built; use ProxyConfig.from_ini() to load from file.
+    """
+
+    # Server settings
+    host: str = DEFAULTS["host"]
+    port: int = DEFAULTS["port"]
+    backlog: int = DEFAULTS["backlog"]
+    timeout: int = DEFAULTS["timeout"]
+
+    # Concurrency settings
+    max_connections: int = DEFAULTS["max_connections"]
+
+    # Logging settings
+    log_dir: str = DEFAULTS["log_dir"]
+    log_file: str = DEFAULTS["log_file"]
+    max_log_size: int = DEFAULTS["max_log_size"]
+    log_rotation_count: int = DEFAULTS["log_rotation_count"]
+    log_level: str = DEFAULTS["log_level"]
+
+    # Filtering settings
+    blocked_list: str = DEFAULTS["blocked_list"]
+    enable_filtering: bool = DEFAULTS["enable_filtering"]
+    case_sensitive: bool = DEFAULTS["case_sensitive"]
+
+    # Forwarding settings
+    buffer_size: int = DEFAULTS["buffer_size"]
+    socket_buffer_size: int = DEFAULTS["socket_buffer_size"]
+    connect_timeout: int = DEFAULTS["connect_timeout"]
+    forward_body: bool = DEFAULTS["forward_body"]
+
+    # Feature flags
+    enable_https: bool = DEFAULTS["enable_https"]
+    track_sizes: bool = DEFAULTS["track_sizes"]
+    detailed_errors: bool = DEFAULTS["detailed_errors"]
+
+    @classmethod
+    def from_ini(cls, config_file=CONFIG_FILE):
+        """
+        Load configuration from file or use defaults.
+        Parsed values are cached next to the config file and reused
+        while the file is unchanged, skipping configparser entirely.
+        The ConfigParser is discarded once settings are extracted.
+
+        Args:
+            config_file: Path to configuration file
+
+        Returns:
+            ProxyConfig: Loaded configuration
+        """
+        if not os.path.exists(config_file):
+            print(f"[!] Warning: Config file {config_file} not found, using defaults")
+            return cls()
+
+        st = os.stat(config_file)
+        # Defaults and the parser version are part of the key, so changing
+        # either in code invalidates the cache even if the file is untouched
+        cache_key = (CACHE_VERSION, config_file, st.st_mtime_ns, st.st_size,
+                     tuple(f.name for f in fields(cls)),
+                     tuple(sorted(DEFAULTS.items())))
+        cache_file = os.path.join(os.path.dirname(config_file),
+                                  CACHE_FILE_NAME)
+
+        settings = _load_cache(cache_file, cache_key)
+        if settings is None:
+            parser = configparser.ConfigParser()
+            parser.read(config_file)
+            settings = _parse(parser)
+            _save_cache(cache_file, cache_key, settings)
+
+        return cls(**settings)
 
     def display(self):
         """Print current configuration."""
@@ -123,6 +242,7 @@ class ProxyConfig:
         print(f"Socket Timeout: {self.timeout}s")
         print(f"Max Connections: {self.max_connections if self.max_connections > 0 else 'Unlimited'}")
         print(f"Buffer Size: {self.buffer_size} bytes")
+        print(f"Socket Buffer Size: {self.socket_buffer_size or 'Kernel default'}")
         print(f"Connect Timeout: {self.connect_timeout}s")
         print(f"Log Directory: {self.log_dir}")
         print(f"Max Log Size: {self.max_log_size} KB")
@@ -134,4 +254,4 @@ class ProxyConfig:
 
 
 # Global configuration instance
-config = ProxyConfig()
+config = ProxyConfig.from_ini()
@@ -3,12 +3,56 @@ Domain and IP filtering module.
 Implements blocklist-based filtering with configurable matching rules.
 """
 
+import functools
 import os
 
 BLOCKED_SET = set()
 CONFIG = None
 
 
+# Blocklist as a trie of reversed domain labels: com -> example -> www.
+# A node containing TERMINAL marks a blocked domain (and all its subdomains).
+# Entries covered by a blocked parent domain are kept in BLOCKED_SET but
+# left out of the trie, so removing the parent leaves them blocked.
+BLOCKED_TRIE = {}
+TERMINAL = "$"
+
+# Longest valid DNS name. Longer hosts (the Host header is client-supplied)
+# are matched without memoizing, so they cannot pin memory in the cache.
+MAX_CACHED_HOST = 253
+
+
+def _parents(host):
+    """
+    Yield each strict parent suffix of a host, longest first.
+
+    Example: "a.b.example.com" yields "b.example.com", "example.com", "com".
+    """
+    _, sep, host = host.partition(".")
+    while sep:
+        yield host
+        _, sep, host = host.partition(".")
+
+
+def _trie_add(entry):
+    """Mark entry as blocked in BLOCKED_TRIE, dropping its now-redundant subtree."""
+    node = BLOCKED_TRIE
+    for label in reversed(entry.split(".")):
+        node = node.setdefault(label, {})
+    node.clear()
+    node[TERMINAL] = True
+
+
+def _rebuild_trie():
+    """Rebuild BLOCKED_TRIE from the current blocklist."""
+    global BLOCKED_TRIE
+
+    BLOCKED_TRIE = {}
+    for entry in BLOCKED_SET:
+        if not any(p in BLOCKED_SET for p in _parents(entry)):
+            _trie_add(entry)
+
+
 def init_filter(config):
     """
     Initialize filter with configuration.
@@ -38,27 +82,24 @@ def load_blocklist(blocklist_file, case_sensitive=False):
         blocklist_file: Path to blocklist file
         case_sensitive: If True, perform case-sensitive matching
     """
-    global BLOCKED_SET
-
     if not os.path.exists(blocklist_file):
         print(f"[!] Warning: Blocklist file {blocklist_file} not found")
         return
 
-    count = 0
+    # Read and lowercase the whole file at once rather than line by line
     with open(blocklist_file, "r") as f:
-        for line in f:
-            line = line.strip()
+        data = f.read()
+    if not case_sensitive:
+        data = data.lower()
 
-            # Skip empty lines and comments
-            if not line or line.startswith("#"):
-                continue
+    # Skip empty lines and comments
+    entries = [line for line in map(str.strip, data.splitlines())
+               if line and not line.startswith("#")]
+    BLOCKED_SET.update(entries)
+    _rebuild_trie()
+    _is_blocked_cached.cache_clear()
 
-            # Add to blocklist (lowercase if case-insensitive)
-            entry = line if case_sensitive else line.lower()
-            BLOCKED_SET.add(entry)
-            count += 1
-
-    print(f"[+] Loaded {count} entries from blocklist")
+    print(f"[+] Loaded {len(entries)} entries from blocklist")
 
 
 def is_blocked(host):
@@ -82,24 +123,49 @@ def is_blocked(host):
     if not host:
         return False
 
-    # Convert to lowercase if case-insensitive matching
-    check_host = host if CONFIG.case_sensitive else host.lower()
-
-    # Check exact match
-    if check_host in BLOCKED_SET:
+    # Convert to lowercase if case-insensitive matching, but first try the
+    # host as given: DNS names almost always arrive lowercase already
+    if CONFIG.case_sensitive:
+        check_host = host
+    elif host in BLOCKED_SET:
         return True
+    else:
+        check_host = host.lower()
+
+    if len(check_host) > MAX_CACHED_HOST:
+        return _match_host(check_host)
+    return _is_blocked_cached(check_host)
+
+
+def _match_host(check_host):
+    """
+    Match a normalized host against the blocklist.
+    Memoized as _is_blocked_cached; the cache is cleared whenever the
+    blocklist changes.
+
+    Args:
+        check_host: Hostname or IP, already lowercased if case-insensitive
 
-    # Check subdomain matching
+    Returns:
+        bool: True if the host or any parent domain is blocked
+    """
+    # Walk the trie from the top-level domain down; reaching a blocked node
+    # means the host or one of its parent domains is blocked
     # If example.com is blocked, www.example.com should also be blocked
-    parts = check_host.split(".")
-    for i in range(len(parts)):
-        parent_domain = ".".join(parts[i:])
-        if parent_domain in BLOCKED_SET:
+    node = BLOCKED_TRIE
+    for label in reversed(check_host.split(".")):
+        node = node.get(label)
+        if node is None:
+            return False
+        if TERMINAL in node:
             return True
 
     return False
 
 
+_is_blocked_cached = functools.lru_cache(maxsize=4096)(_match_host)
+
+
 def add_to_blocklist(host):
     """
     Add a host to the blocklist at runtime.
@@ -107,23 +173,28 @@ def add_to_blocklist(host):
     Args:
         host: Hostname or IP to block
     """
-    global BLOCKED_SET
-
     entry = host if (CONFIG and CONFIG.case_sensitive) else host.lower()
     BLOCKED_SET.add(entry)
+    if not any(p in BLOCKED_SET for p in _parents(entry)):
+        _trie_add(entry)
+    _is_blocked_cached.cache_clear()
 
 
 def remove_from_blocklist(host):
     """
     Remove a host from the blocklist at runtime.
+    Subdomains that are listed in their own right stay blocked.
 
     Args:
         host: Hostname or IP to unblock
     """
-    global BLOCKED_SET
-
     entry = host if (CONFIG and CONFIG.case_sensitive) else host.lower()
-    BLOCKED_SET.discard(entry)
+    if entry in BLOCKED_SET:
+        BLOCKED_SET.discard(entry)
+        # Rebuild rather than unmark, to restore listed subdomains the
+        # entry's trie node had absorbed
+        _rebuild_trie()
+        _is_blocked_cached.cache_clear()
 
 
 def get_blocklist():
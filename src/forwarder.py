@@ -3,130 +3,380 @@ Traffic forwarding module for the proxy server.
 Handles HTTP request/response forwarding and HTTPS tunneling.
 """
 
+import errno
+import os
+import select
+import selectors
 import socket
 import threading
-from parser import recv_request_body, extract_response_status
+import time
+from collections import defaultdict, deque
+from parser import (HEADER_TERMINATOR, recv_request_body,
+                    extract_response_status, parse_response_framing)
 
+# os.splice errors meaning the kernel cannot splice these descriptors
+SPLICE_UNSUPPORTED = (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)
 
-class DataTracker:
-    """Tracks bytes sent and received during forwarding."""
+# Idle keep-alive connections to destination servers, keyed by (host, port).
+# Each deque holds (socket, idle_since) pairs, most recently used last.
+UPSTREAM_POOL = defaultdict(deque)
+upstream_pool_lock = threading.Lock()
+MAX_IDLE_PER_HOST = 8
+UPSTREAM_IDLE_TIMEOUT = 30  # seconds
+MAX_RESPONSE_HEAD = 65536  # stop looking for the end of headers after this
 
-    def __init__(self):
-        self.bytes_sent = 0
-        self.bytes_received = 0
-        self.lock = threading.Lock()
+# Methods safe to resend if a pooled connection fails mid-request (RFC 9110)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE",
+                                "TRACE"})
 
-    def add_sent(self, count):
-        """Add to bytes sent counter."""
-        with self.lock:
-            self.bytes_sent += count
+# TCP_QUICKACK (Linux only; None elsewhere)
+QUICKACK = getattr(socket, "TCP_QUICKACK", None)
+_last_sweep = time.monotonic()
 
-    def add_received(self, count):
-        """Add to bytes received counter."""
-        with self.lock:
-            self.bytes_received += count
 
-    def get_stats(self):
-        """Get current statistics."""
-        with self.lock:
-            return self.bytes_sent, self.bytes_received
+def tune_socket(sock, config):
+    """
+    Apply latency and throughput socket options to a connected socket.
 
+    Disables Nagle's algorithm so small writes (headers, then body) go out
+    immediately, and sets the kernel send/receive buffer sizes if
+    configured. A size of 0 leaves the kernel's auto-tuning in effect.
 
-def forward_data(source_sock, destination_sock, tracker, is_sending, buffer_size=4096):
+    Args:
+        sock: Connected TCP socket
+        config: ProxyConfig instance
     """
-    Forward data from source socket to destination socket with byte tracking.
-    Used as a thread target for bidirectional tunneling.
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if config.socket_buffer_size > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                            config.socket_buffer_size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                            config.socket_buffer_size)
+    except OSError:
+        pass  # Options are an optimization; the socket still works without
+
+
+def _is_stale(sock):
     """
+    Check whether an idle pooled connection has been closed by the server.
+    An idle connection should have nothing to read; if it is readable
+    the server has closed it (or sent something unsolicited).
+
+    Peeks with a non-blocking recv rather than select(), which cannot
+    handle descriptors numbered FD_SETSIZE (1024) or higher.
+    """
+    timeout = sock.gettimeout()
     try:
-        while True:
-            data = source_sock.recv(buffer_size)
-            if not data:
+        sock.setblocking(False)
+        sock.recv(1, socket.MSG_PEEK)
+        return True
+    except BlockingIOError:
+        sock.settimeout(timeout)
+        return False
+    except OSError:
+        return True
+
+
+def acquire_upstream(key):
+    """
+    Take an idle pooled connection to a destination server.
+    Connections idle for too long, or that the server has since closed,
+    are discarded.
+
+    Args:
+        key: (host, port) of the destination server
+
+    Returns:
+        socket or None: A connected socket, or None if none is pooled
+    """
+    now = time.monotonic()
+    stale = []
+    sock = None
+    with upstream_pool_lock:
+        idle = UPSTREAM_POOL.get(key)
+        while idle:
+            candidate, idle_since = idle.pop()
+            if now - idle_since < UPSTREAM_IDLE_TIMEOUT:
+                sock = candidate
                 break
-            destination_sock.sendall(data)
+            stale.append(candidate)
+
+    try:
+        if sock is not None and _is_stale(sock):
+            stale.append(sock)
+            sock = None
+    finally:
+        for candidate in stale:
+            candidate.close()
+    return sock
+
+
+def release_upstream(key, sock):
+    """
+    Return a connection to the pool for reuse by later requests.
+    Expired connections to every destination are swept out at most
+    once per UPSTREAM_IDLE_TIMEOUT.
+
+    Args:
+        key: (host, port) of the destination server
+        sock: Connected socket with no response data left unread
+    """
+    global _last_sweep
 
-            # Track bytes
-            if is_sending:
-                tracker.add_sent(len(data))
-            else:
-                tracker.add_received(len(data))
-    except Exception:
-        pass
+    now = time.monotonic()
+    stale = []
+    with upstream_pool_lock:
+        idle = UPSTREAM_POOL[key]
+        if len(idle) >= MAX_IDLE_PER_HOST:
+            stale.append(idle.popleft()[0])
+        idle.append((sock, now))
 
+        if now - _last_sweep > UPSTREAM_IDLE_TIMEOUT:
+            _last_sweep = now
+            for pool_key in list(UPSTREAM_POOL):
+                idle = UPSTREAM_POOL[pool_key]
+                while idle and now - idle[0][1] >= UPSTREAM_IDLE_TIMEOUT:
+                    stale.append(idle.popleft()[0])
+                if not idle:
+                    del UPSTREAM_POOL[pool_key]
 
-def tunnel(client_sock, server_sock, buffer_size=4096):
+    for candidate in stale:
+        candidate.close()
+
+
+def splice_data(source_sock, destination_sock, pipe, buffer_size):
+    """
+    Move up to buffer_size bytes between sockets through a pipe,
+    entirely inside the kernel (Linux only).
+
+    Args:
+        source_sock: Socket to read from (must be readable)
+        destination_sock: Socket to write to
+        pipe: (read_fd, write_fd) pair from os.pipe(), empty on entry
+        buffer_size: Maximum number of bytes to move
+
+    Returns:
+        int: Number of bytes moved (0 on EOF)
+    """
+    pipe_r, pipe_w = pipe
+    count = os.splice(source_sock.fileno(), pipe_w, buffer_size,
+                      flags=os.SPLICE_F_MOVE)
+
+    remaining = count
+    poller = None
+    while remaining:
+        try:
+            remaining -= os.splice(pipe_r, destination_sock.fileno(), remaining,
+                                   flags=os.SPLICE_F_MOVE)
+        except BlockingIOError:
+            # Destination send buffer is full, wait until it drains.
+            # poll() rather than select(), which fails on fds >= 1024
+            if poller is None:
+                poller = select.poll()
+                poller.register(destination_sock, select.POLLOUT)
+            timeout = destination_sock.gettimeout()
+            if not poller.poll(None if timeout is None else timeout * 1000):
+                raise socket.timeout("splice to destination timed out")
+
+    return count
+
+
+def tunnel(client_sock, server_sock, buffer_size=65536):
     """
     Create bidirectional tunnel between client and server.
     Used for HTTPS CONNECT tunneling.
+
+    Both directions are serviced from the calling thread with a selector,
+    so no extra threads or locks are needed per tunnel. The tunnel ends
+    once both sides have closed, or when neither side sends anything
+    within the client socket's timeout.
+
+    On Linux, bytes are moved with os.splice so they never enter Python;
+    otherwise (or if splicing is refused) it falls back to recv/sendall.
+
+    Returns:
+        tuple: (bytes_sent, bytes_received)
     """
-    tracker = DataTracker()
+    bytes_sent = 0
+    bytes_received = 0
+    idle_timeout = client_sock.gettimeout()
+    peers = {client_sock: server_sock, server_sock: client_sock}
+    pipe = os.pipe() if hasattr(os, "splice") else None
+    view = None
+
+    with selectors.DefaultSelector() as sel:
+        sel.register(client_sock, selectors.EVENT_READ)
+        sel.register(server_sock, selectors.EVENT_READ)
+
+        try:
+            while sel.get_map():
+                events = sel.select(idle_timeout)
+                if not events:
+                    break  # Idle timeout
+
+                for key, _ in events:
+                    source_sock = key.fileobj
+                    destination_sock = peers[source_sock]
 
-    # Create thread for client → server forwarding
-    client_to_server = threading.Thread(
-        target=forward_data,
-        args=(client_sock, server_sock, tracker, True, buffer_size)
-    )
-    client_to_server.daemon = True
+                    count = None
+                    if pipe:
+                        try:
+                            count = splice_data(source_sock, destination_sock,
+                                                pipe, buffer_size)
+                        except OSError as e:
+                            if e.errno not in SPLICE_UNSUPPORTED:
+                                raise
+                            os.close(pipe[0])
+                            os.close(pipe[1])
+                            pipe = None
 
-    # Create thread for server → client forwarding
-    server_to_client = threading.Thread(
-        target=forward_data,
-        args=(server_sock, client_sock, tracker, False, buffer_size)
-    )
-    server_to_client.daemon = True
+                    if count is None:
+                        # Reuse one buffer instead of a new bytes per chunk
+                        if view is None:
+                            view = memoryview(bytearray(buffer_size))
+                        count = source_sock.recv_into(view)
+                        if count:
+                            destination_sock.sendall(view[:count])
 
-    # Start both threads
-    client_to_server.start()
-    server_to_client.start()
+                    if not count:
+                        # Pass the half-close on so the peer sees EOF too
+                        sel.unregister(source_sock)
+                        try:
+                            destination_sock.shutdown(socket.SHUT_WR)
+                        except OSError:
+                            pass
+                        continue
 
-    # Wait for both threads to complete
-    client_to_server.join()
-    server_to_client.join()
+                    # Track bytes
+                    if source_sock is client_sock:
+                        bytes_sent += count
+                    else:
+                        bytes_received += count
+        except OSError:
+            pass
+        finally:
+            if pipe:
+                os.close(pipe[0])
+                os.close(pipe[1])
 
-    return tracker.get_stats()
+    return bytes_sent, bytes_received
 
 
 def forward_http(parsed, client_sock, config):
     """
     Forward HTTP request to destination server and return response to client.
+    Reuses a pooled keep-alive connection to the destination when one is
+    idle, and pools the connection again once a response with a known
+    length has been relayed in full.
     """
+    key = (parsed.host, parsed.port)
     server_sock = None
     bytes_sent = 0
     bytes_received = 0
     response_status = None
 
     try:
-        # Create connection to destination server
-        server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_sock.settimeout(config.connect_timeout)
-        server_sock.connect((parsed["host"], parsed["port"]))
-
-        # Send request headers to server
-        server_sock.sendall(parsed["raw"])
-        bytes_sent += len(parsed["raw"])
-
-        # Handle request body if Content-Length is present
-        if config.forward_body and parsed["content_length"] > 0:
-            body = recv_request_body(client_sock, parsed["content_length"],
-                                    config.buffer_size)
-            if body:
-                server_sock.sendall(body)
-                bytes_sent += len(body)
-
         # Receive and forward response from server to client
         # Use streaming to avoid buffering entire response in memory
-        first_chunk = True
+        # Receive into one preallocated buffer rather than a new bytes per chunk
+        buffer = bytearray(config.buffer_size)
+        view = memoryview(buffer)
+
+        # Handle request body if Content-Length is present. Read it before
+        # touching the upstream so a client failing mid-body is not taken
+        # for a stale pooled connection below
+        if config.forward_body and parsed.content_length > 0:
+            body = recv_request_body(client_sock, parsed.content_length,
+                                     config.buffer_size, parsed.buffered_body)
+        else:
+            # Pass on whatever arrived with the headers (e.g. a chunked
+            # body), as it is not in raw
+            body = parsed.buffered_body
+
+        # Only idempotent requests use pooled connections: the server may
+        # already have acted on a request when the connection drops, so
+        # only those can be safely retried below
+        server_sock = None
+        if parsed.method in IDEMPOTENT_METHODS:
+            server_sock = acquire_upstream(key)
+        reused = server_sock is not None
         while True:
-            response = server_sock.recv(config.buffer_size)
-            if not response:
+            if server_sock is None:
+                # Create connection to destination server
+                server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                server_sock.settimeout(config.connect_timeout)
+                server_sock.connect(key)
+                tune_socket(server_sock, config)
+
+            try:
+                # Send request headers and body to server
+                server_sock.sendall(parsed.raw)
+                if body:
+                    server_sock.sendall(body)
+
+                # Acknowledge the response promptly: a server that writes
+                # headers and body separately with Nagle on would otherwise
+                # wait on our delayed ACK (~40ms) on reused connections
+                if QUICKACK:
+                    server_sock.setsockopt(socket.IPPROTO_TCP, QUICKACK, 1)
+
+                count = server_sock.recv_into(view)
+            except ConnectionError:
+                if not reused:
+                    raise
+                count = 0
+
+            if count or not reused:
+                break
+
+            # The server closed the pooled connection before answering;
+            # retry once on a fresh connection
+            server_sock.close()
+            server_sock = None
+            reused = False
+
+        bytes_sent += len(parsed.raw) + len(body)
+
+        # Extract status code from first chunk
+        if count and config.track_sizes:
+            response_status = extract_response_status(buffer[:count])
+
+        # Follow the response framing so the body's end is noticed without
+        # waiting for the server to close (or time out) the connection
+        head = bytearray()
+        scan_from = 0
+        response_length = None
+        keep_alive = False
+        while count:
+            client_sock.sendall(view[:count])
+            bytes_received += count
+
+            if head is not None:
+                head += view[:count]
+                header_end = head.find(HEADER_TERMINATOR, scan_from)
+                if header_end >= 0:
+                    body_length, keep_alive = parse_response_framing(
+                        bytes(head[:header_end]), parsed.method)
+                    if body_length is not None:
+                        response_length = (header_end + len(HEADER_TERMINATOR)
+                                           + body_length)
+                    head = None
+                elif len(head) > MAX_RESPONSE_HEAD:
+                    head = None
+                else:
+                    # Resume the search where this one stopped
+                    scan_from = max(0, len(head) - len(HEADER_TERMINATOR) + 1)
+
+            if response_length is not None and bytes_received >= response_length:
                 break
 
-            # Extract status code from first chunk
-            if first_chunk and config.track_sizes:
-                response_status = extract_response_status(response)
-                first_chunk = False
+            count = server_sock.recv_into(view)
 
-            client_sock.sendall(response)
-            bytes_received += len(response)
+        # Keep the connection for the next request to this destination
+        if keep_alive and bytes_received == response_length:
+            release_upstream(key, server_sock)
+            server_sock = None
 
     except socket.timeout:
         # --- FIX: SMART TIMEOUT HANDLING ---
@@ -145,8 +395,8 @@ def forward_http(parsed, client_sock, config):
         print(f"!!! DEBUG ERROR: {e} !!!")  # <--- This will tell us the secret
         response_status = "ERROR"
     finally:
-        # Close server connection
+        # Close server connection unless it went back to the pool
         if server_sock:
             server_sock.close()
 
-    return response_status, bytes_sent, bytes_received
\ No newline at end of file
+    return response_status, bytes_sent, bytes_received
@@ -3,12 +3,52 @@ Request handler module for the proxy server.
 Orchestrates request processing, filtering, and forwarding.
 """
 
+import functools
 import socket
-from parser import recv_http_request, parse_http_request
+from parser import (MAX_HEADER_SIZE, recv_http_request, parse_http_request,
+                    release_request)
 from filter import is_blocked
-from forwarder import tunnel, forward_http
+from forwarder import tunnel, forward_http, tune_socket
 from logger import (log_request, increment_total, increment_allowed,
-                   increment_blocked, add_bytes_sent, add_bytes_received)
+                   increment_blocked, add_bytes)
+
+# Error response status line and headers: (code, status, content length)
+ERROR_HEADER = (b"HTTP/1.1 %d %s\r\n"
+                b"Content-Type: text/html; charset=utf-8\r\n"
+                b"Content-Length: %d\r\n"
+                b"Connection: close\r\n"
+                b"\r\n")
+
+# Error page bodies, encoded once at import and filled in with bytes
+# %-formatting: (code, status, code, status, message)
+ERROR_PAGE_DETAILED = b"""<!DOCTYPE html>
+<html>
+<head>
+    <title>%d %s</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 40px; }
+        h1 { color: #d32f2f; }
+        .error-code { font-size: 72px; font-weight: bold; color: #e0e0e0; }
+        .message { margin-top: 20px; padding: 20px; background: #f5f5f5; border-left: 4px solid #d32f2f; }
+    </style>
+</head>
+<body>
+    <div class="error-code">%d</div>
+    <h1>%s</h1>
+    <div class="message">%s</div>
+    <hr>
+    <p><small>Custom Network Proxy Server</small></p>
+</body>
+</html>"""
+
+ERROR_PAGE_SIMPLE = b"""<!DOCTYPE html>
+<html>
+<head><title>%d %s</title></head>
+<body>
+    <h1>%d %s</h1>
+    <p>%s</p>
+</body>
+</html>"""
 
 
 def handle_client(client_sock, client_addr, config):
@@ -30,18 +70,27 @@ def handle_client(client_sock, client_addr, config):
         6. Log request with detailed metrics
         7. Close client socket
     """
+    parsed = None
     try:
         # Set socket timeout from config
         if config.timeout > 0:
             client_sock.settimeout(config.timeout)
 
         # Receive HTTP request
-        request_data = recv_http_request(client_sock, config.buffer_size)
+        request_data, headers_end = recv_http_request(client_sock,
+                                                      config.buffer_size)
+        if request_data is None:
+            send_error_response(client_sock, 431,
+                              "Request Header Fields Too Large",
+                              f"Request headers exceed {MAX_HEADER_SIZE} bytes",
+                              config)
+            discard_unread(client_sock, config.buffer_size)
+            return
         if not request_data:
             return
 
         # Parse request
-        parsed = parse_http_request(request_data)
+        parsed = parse_http_request(request_data, headers_end)
         if not parsed:
             send_error_response(client_sock, 400, "Bad Request",
                               "Invalid HTTP request", config)
@@ -50,9 +99,9 @@ def handle_client(client_sock, client_addr, config):
         # Increment total requests
         increment_total()
 
-        host = parsed["host"]
-        port = parsed["port"]
-        method = parsed["method"]
+        host = parsed.host
+        port = parsed.port
+        method = parsed.method
 
         # Check if destination is blocked
         if is_blocked(host):
@@ -99,6 +148,9 @@ def handle_client(client_sock, client_addr, config):
         except:
             pass
 
+        if parsed:
+            release_request(parsed)
+
 
 def handle_connect(client_sock, client_addr, parsed, config):
     """
@@ -108,7 +160,7 @@ def handle_connect(client_sock, client_addr, parsed, config):
     Args:
         client_sock: Client socket
         client_addr: Client address tuple
-        parsed: Parsed request dictionary
+        parsed: Parsed Request
         config: ProxyConfig instance
     """
     server_sock = None
@@ -116,13 +168,14 @@ def handle_connect(client_sock, client_addr, parsed, config):
     bytes_received = 0
 
     try:
-        host = parsed["host"]
-        port = parsed["port"]
+        host = parsed.host
+        port = parsed.port
 
         # Connect to destination server
         server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_sock.settimeout(config.connect_timeout)
         server_sock.connect((host, port))
+        tune_socket(server_sock, config)
 
         # Send 200 Connection Established to client
         connect_response = b"HTTP/1.1 200 Connection Established\r\n\r\n"
@@ -133,8 +186,7 @@ def handle_connect(client_sock, client_addr, parsed, config):
                                            config.buffer_size)
 
         # Update global metrics
-        add_bytes_sent(bytes_sent)
-        add_bytes_received(bytes_received)
+        add_bytes(bytes_sent, bytes_received)
 
         # Log the connection with metrics
         log_request(client_addr, host, port, "CONNECT", "ALLOWED",
@@ -159,9 +211,9 @@ def handle_http(client_sock, client_addr, parsed, config):
     """
     Handle regular HTTP request.
     """
-    host = parsed["host"]
-    port = parsed["port"]
-    method = parsed["method"]
+    host = parsed.host
+    port = parsed.port
+    method = parsed.method
     
     # Initialize variables to avoid "UnboundLocalError"
     response_status = "ERROR" 
@@ -182,8 +234,8 @@ def handle_http(client_sock, client_addr, parsed, config):
 
     # 2. Update Metrics (Thread-safe)
     try:
-        if bytes_sent > 0: add_bytes_sent(bytes_sent)
-        if bytes_received > 0: add_bytes_received(bytes_received)
+        if bytes_sent > 0 or bytes_received > 0:
+            add_bytes(bytes_sent, bytes_received)
     except:
         pass
 
@@ -196,6 +248,29 @@ def handle_http(client_sock, client_addr, parsed, config):
     else:
         log_request(client_addr, host, port, method, "ERROR")
         
+def discard_unread(client_sock, buffer_size):
+    """
+    Half-close the client connection and read off what it is still sending.
+    Closing a socket with unread data resets the connection, which can
+    discard a response the client has not read yet.
+
+    Args:
+        client_sock: Client socket
+        buffer_size: Size of receive buffer
+    """
+    try:
+        client_sock.shutdown(socket.SHUT_WR)
+        client_sock.settimeout(1)
+        remaining = MAX_HEADER_SIZE
+        while remaining > 0:
+            chunk = client_sock.recv(min(buffer_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+    except OSError:
+        pass
+
+
 def send_error_response(client_sock, status_code, status_message, body_message, config):
     """
     Send an HTTP error response to the client.
@@ -208,51 +283,57 @@ def send_error_response(client_sock, status_code, status_message, body_message,
         config: ProxyConfig instance
     """
     try:
-        # Build detailed HTML response if enabled
-        if config.detailed_errors:
-            html_body = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>{status_code} {status_message}</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 40px; }}
-        h1 {{ color: #d32f2f; }}
-        .error-code {{ font-size: 72px; font-weight: bold; color: #e0e0e0; }}
-        .message {{ margin-top: 20px; padding: 20px; background: #f5f5f5; border-left: 4px solid #d32f2f; }}
-    </style>
-</head>
-<body>
-    <div class="error-code">{status_code}</div>
-    <h1>{status_message}</h1>
-    <div class="message">{body_message}</div>
-    <hr>
-    <p><small>Custom Network Proxy Server</small></p>
-</body>
-</html>"""
-        else:
-            html_body = f"""<!DOCTYPE html>
-<html>
-<head><title>{status_code} {status_message}</title></head>
-<body>
-    <h1>{status_code} {status_message}</h1>
-    <p>{body_message}</p>
-</body>
-</html>"""
+        client_sock.sendall(build_error_response(status_code, status_message,
+                                                 body_message,
+                                                 config.detailed_errors))
+    except Exception:
+        # If error response fails, silently ignore
+        pass
+
+
+def build_error_response(status_code, status_message, body_message, detailed):
+    """
+    Build a complete HTTP error response.
 
-        body_bytes = html_body.encode("utf-8")
+    Args:
+        status_code: HTTP status code (e.g., 403, 500)
+        status_message: HTTP status message (e.g., "Forbidden")
+        body_message: Detailed error message for response body
+        detailed: Use the detailed error page instead of the simple one
 
-        # Build HTTP response
-        response = (
-            f"HTTP/1.1 {status_code} {status_message}\r\n"
-            f"Content-Type: text/html; charset=utf-8\r\n"
-            f"Content-Length: {len(body_bytes)}\r\n"
-            f"Connection: close\r\n"
-            f"\r\n"
-        ).encode("utf-8")
+    Returns:
+        bytes: Status line, headers and HTML body
+    """
+    # Fill in the detailed or simple error page
+    status_bytes, before, after = _error_page(status_code, status_message,
+                                              detailed)
+    body_bytes = before + body_message.encode("utf-8") + after
 
-        # Send response
-        client_sock.sendall(response + body_bytes)
+    # Build HTTP response
+    return ERROR_HEADER % (status_code, status_bytes, len(body_bytes)) + body_bytes
 
-    except Exception:
-        # If error response fails, silently ignore
-        pass
+
+@functools.lru_cache(maxsize=64)
+def _error_page(status_code, status_message, detailed):
+    """
+    Fill in the parts of an error page around the message.
+    Memoized per status; the message is left out of the key because it
+    can carry client-supplied text (e.g. the blocked host).
+
+    Args:
+        status_code: HTTP status code (e.g., 403, 500)
+        status_message: HTTP status message (e.g., "Forbidden")
+        detailed: Use the detailed error page instead of the simple one
+
+    Returns:
+        tuple: (encoded status message, page bytes before the message,
+                page bytes after it)
+    """
+    status_bytes = status_message.encode("utf-8")
+    page = ERROR_PAGE_DETAILED if detailed else ERROR_PAGE_SIMPLE
+    # The message is the last placeholder in both pages
+    split = page.rindex(b"%s")
+    before = page[:split] % (status_code, status_bytes, status_code,
+                             status_bytes)
+    after = page[split + 2:] % ()
+    return status_bytes, before, after
@@ -1,22 +1,50 @@
 """
 Logging and metrics module for the proxy server.
 Provides thread-safe logging with automatic rotation and detailed metrics tracking.
+Log entries are queued and written by a single background writer thread.
 """
 
 import os
+import queue
 import threading
-from datetime import datetime
+import time
 
-log_lock = threading.Lock()
 metrics_lock = threading.Lock()
 
-metrics = {
-    "total": 0,
-    "allowed": 0,
-    "blocked": 0,
-    "bytes_sent": 0,
-    "bytes_received": 0
-}
+# Pending log entries, drained by the writer thread (None stops it).
+# Bounded so a stalled disk cannot grow memory without limit; when full,
+# new entries are dropped and counted rather than blocking request threads
+# (the console copy is still printed).
+LOG_QUEUE_SIZE = 10000
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_dropped_entries = 0  # Updated under metrics_lock
+_writer_thread = None
+LOG_BATCH_SIZE = 256
+_current_size = 0  # Size of LOG_FILE in bytes, tracked by the writer thread
+
+
+class Metrics:
+    """Request and byte counters for one thread; only that thread writes them."""
+
+    __slots__ = ("total", "allowed", "blocked", "bytes_sent", "bytes_received")
+
+    def __init__(self):
+        self.total = 0
+        self.allowed = 0
+        self.blocked = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+# Each thread counts into its own Metrics, so the request path takes no
+# lock; get_metrics() sums them. Every thread's Metrics stays in
+# _all_metrics after the thread exits so its counts are not lost.
+_thread_metrics = threading.local()
+_all_metrics = []  # Appended under metrics_lock
+
+# (second, formatted timestamp) of the last log entry. Replaced as a whole
+# tuple, so readers never see a mismatched pair.
+_ts_cache = (0, "")
 
 # Will be initialized from config
 LOG_DIR = "logs"
@@ -28,11 +56,13 @@ LOG_ROTATION_COUNT = 5
 def init_logger(config):
     """
     Initialize logger with configuration.
+    Starts the background writer thread.
 
     Args:
         config: ProxyConfig instance
     """
-    global LOG_DIR, LOG_FILE, MAX_LOG_SIZE, LOG_ROTATION_COUNT
+    global LOG_DIR, LOG_FILE, MAX_LOG_SIZE, LOG_ROTATION_COUNT, _writer_thread
+    global _current_size
 
     LOG_DIR = config.log_dir
     LOG_FILE = os.path.join(LOG_DIR, config.log_file)
@@ -43,12 +73,43 @@ def init_logger(config):
     if not os.path.exists(LOG_DIR):
         os.makedirs(LOG_DIR)
 
+    # Only time the log size is read from disk; the writer tracks it after
+    _current_size = os.path.getsize(LOG_FILE) if os.path.exists(LOG_FILE) else 0
+
+    if _writer_thread is None:
+        _writer_thread = threading.Thread(target=_log_writer, name="LogWriter",
+                                          daemon=True)
+        _writer_thread.start()
+
+
+def close_logger():
+    """
+    Flush pending log entries and stop the writer thread.
+    Called on server shutdown; safe to call more than once.
+    """
+    global _writer_thread
+
+    if _writer_thread is None:
+        return
+
+    try:
+        _log_queue.put(None, timeout=5)
+    except queue.Full:
+        pass  # Writer is stuck; it is a daemon thread, so leave it
+    else:
+        _writer_thread.join(timeout=5)
+    _writer_thread = None
+
+    if _dropped_entries:
+        print(f"[!] Warning: Dropped {_dropped_entries} log entries "
+              f"(log writer could not keep up)")
+
 
 def log_request(client_addr, host, port, method, status, response_status=None,
                 bytes_sent=0, bytes_received=0):
     """
     Log a request with comprehensive details.
-    Thread-safe logging with automatic log rotation.
+    The entry is queued for the writer thread; callers never touch the file.
 
     Args:
         client_addr: Tuple of (ip, port) for client
@@ -63,42 +124,103 @@ def log_request(client_addr, host, port, method, status, response_status=None,
     if LOG_FILE is None:
         return  # Logger not initialized
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = _timestamp()
 
     # Build log entry with available information
-    log_parts = [
-        f"[{timestamp}]",
-        f"{client_addr}",
-        f"→ {host}:{port}",
-        f"| {method}",
-        f"| {status}"
-    ]
-
+    extra = ""
     if response_status:
-        log_parts.append(f"| {response_status}")
+        extra += f" | {response_status}"
 
     if bytes_sent > 0 or bytes_received > 0:
-        log_parts.append(f"| ↑{bytes_sent}B ↓{bytes_received}B")
+        extra += f" | ↑{bytes_sent}B ↓{bytes_received}B"
 
-    log_entry = " ".join(log_parts) + "\n"
+    log_entry = (f"[{timestamp}] {client_addr} → {host}:{port} "
+                 f"| {method} | {status}{extra}\n")
 
     print(log_entry.strip())
-    
-    with log_lock:
-        # Check if rotation is needed
-        if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) > MAX_LOG_SIZE:
-            rotate_log()
+    try:
+        _log_queue.put_nowait(log_entry)
+    except queue.Full:
+        _count_dropped_entry()
 
-        # Append to log file
-        with open(LOG_FILE, "a") as f:
-            f.write(log_entry)
+
+def _count_dropped_entry():
+    """Record a log entry dropped because the writer queue was full."""
+    global _dropped_entries
+
+    with metrics_lock:
+        _dropped_entries += 1
+
+
+def _log_writer():
+    """
+    Writer thread body.
+    Keeps the log file open, appends queued entries in batches and
+    rotates the file when it grows past MAX_LOG_SIZE.
+    """
+    global _current_size
+
+    f = open(LOG_FILE, "ab")
+    try:
+        running = True
+        while running:
+            batch = [_log_queue.get()]
+
+            # Drain whatever else is already pending
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(_log_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+                if not batch:
+                    continue
+
+            try:
+                # Check if rotation is needed
+                if _current_size > MAX_LOG_SIZE:
+                    f.close()
+                    rotate_log()
+                    f = open(LOG_FILE, "ab")
+                    _current_size = 0
+
+                # Append to log file
+                data = "".join(batch).encode("utf-8")
+                f.write(data)
+                f.flush()
+                _current_size += len(data)
+            except OSError as e:
+                print(f"[!] Warning: Failed to write log file: {e}")
+    finally:
+        f.close()
+
+
+def _timestamp():
+    """
+    Get the current local time formatted for log entries.
+    Formatting is done at most once per second and reused otherwise.
+
+    Returns:
+        str: Timestamp as "YYYY-MM-DD HH:MM:SS"
+    """
+    global _ts_cache
+
+    now = int(time.time())
+    cached_second, cached = _ts_cache
+    if now != cached_second:
+        cached = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        _ts_cache = (now, cached)
+    return cached
 
 
 def rotate_log():
     """
     Rotate log files when max size is exceeded.
     Keeps LOG_ROTATION_COUNT backup files.
-    Must be called with log_lock held.
+    Must be called from the writer thread with the log file closed.
     """
     if LOG_FILE is None:
         return
@@ -119,44 +241,48 @@ def rotate_log():
         os.rename(LOG_FILE, f"{LOG_FILE}.1")
 
 
+def _metrics():
+    """
+    Get the calling thread's counters, registering them on first use.
+
+    Returns:
+        Metrics: Counters owned by the calling thread
+    """
+    m = getattr(_thread_metrics, "metrics", None)
+    if m is None:
+        m = _thread_metrics.metrics = Metrics()
+        with metrics_lock:
+            _all_metrics.append(m)
+    return m
+
+
 def increment_total():
     """Thread-safe increment of total requests counter."""
-    with metrics_lock:
-        metrics["total"] += 1
+    _metrics().total += 1
 
 
 def increment_allowed():
     """Thread-safe increment of allowed requests counter."""
-    with metrics_lock:
-        metrics["allowed"] += 1
+    _metrics().allowed += 1
 
 
 def increment_blocked():
     """Thread-safe increment of blocked requests counter."""
-    with metrics_lock:
-        metrics["blocked"] += 1
+    _metrics().blocked += 1
 
 
-def add_bytes_sent(count):
+def add_bytes(sent, received):
     """
-    Thread-safe addition to bytes sent counter.
+    Thread-safe addition to the byte counters.
+    Called once per request with that request's totals.
 
     Args:
-        count: Number of bytes to add
+        sent: Number of bytes sent to server
+        received: Number of bytes received from server
     """
-    with metrics_lock:
-        metrics["bytes_sent"] += count
-
-
-def add_bytes_received(count):
-    """
-    Thread-safe addition to bytes received counter.
-
-    Args:
-        count: Number of bytes to add
-    """
-    with metrics_lock:
-        metrics["bytes_received"] += count
+    m = _metrics()
+    m.bytes_sent += sent
+    m.bytes_received += received
 
 
 def get_metrics():
@@ -167,7 +293,14 @@ def get_metrics():
         dict: Copy of current metrics
     """
     with metrics_lock:
-        return metrics.copy()
+        all_metrics = list(_all_metrics)
+
+    # Sum every thread's counters at read time
+    snapshot = dict.fromkeys(Metrics.__slots__, 0)
+    for m in all_metrics:
+        for name in Metrics.__slots__:
+            snapshot[name] += getattr(m, name)
+    return snapshot
 
 
 def print_metrics_summary():
@@ -3,10 +3,23 @@ HTTP request parser module.
 Handles receiving and parsing HTTP requests from client sockets.
 """
 
+import functools
+import threading
 from urllib.parse import urlparse
 
-BUFFER_SIZE = 4096
+BUFFER_SIZE = 16384
 HEADER_TERMINATOR = b"\r\n\r\n"
+MAX_BODY_PREALLOC = 16 * 1024 * 1024
+MAX_HEADER_SIZE = 65536
+MAX_CACHED_NETLOC = 259  # 253-character DNS name plus ":port"
+
+# Request headers the proxy itself reads; others pass through unparsed
+INTERESTING_HEADERS = frozenset({b"host", b"content-length"})
+
+# Per-thread state: each worker reuses one header receive buffer and
+# keeps a few Request objects for reuse
+_thread_local = threading.local()
+MAX_FREE_REQUESTS = 4
 
 
 def recv_http_request(sock, buffer_size=BUFFER_SIZE):
@@ -16,55 +29,191 @@ def recv_http_request(sock, buffer_size=BUFFER_SIZE):
 
     This implements proper header accumulation as recommended in the project specs.
 
+    Socket errors, including socket.timeout, propagate to the caller.
+
     Args:
         sock: Client socket
         buffer_size: Size of receive buffer
 
     Returns:
-        bytes: Complete HTTP request headers including terminator
+        tuple: (data, headers_end) where data is everything received,
+               including any body bytes that arrived with the headers,
+               and headers_end is the offset of the terminator (-1 if
+               the client stopped before sending it). data is None if
+               the headers do not fit in MAX_HEADER_SIZE.
     """
-    data = b""
-    while HEADER_TERMINATOR not in data:
-        try:
-            chunk = sock.recv(buffer_size)
-            if not chunk:
-                break
-            data += chunk
-        except Exception:
+    # Receive into this thread's reusable buffer instead of allocating a
+    # bytes object per recv, and only search the bytes not yet scanned,
+    # keeping enough overlap to catch a terminator split across chunks
+    buffer = _recv_buffer()
+    view = memoryview(buffer)
+    received = 0
+    scan_from = 0
+    headers_end = -1
+    while True:
+        if received == len(buffer):
+            return None, -1  # Headers too large
+        count = sock.recv_into(view[received:],
+                               min(buffer_size, len(buffer) - received))
+        if not count:
+            break
+        received += count
+        headers_end = buffer.find(HEADER_TERMINATOR, scan_from, received)
+        if headers_end >= 0:
             break
-    return data
+        scan_from = max(0, received - len(HEADER_TERMINATOR) + 1)
+    return bytes(view[:received]), headers_end
+
+
+def _recv_buffer():
+    """
+    Get the calling thread's header receive buffer, creating it on first use.
+
+    Returns:
+        bytearray: MAX_HEADER_SIZE bytes, reused across requests
+    """
+    buffer = getattr(_thread_local, "recv_buffer", None)
+    if buffer is None:
+        buffer = _thread_local.recv_buffer = bytearray(MAX_HEADER_SIZE)
+    return buffer
+
+
+class Request:
+    """
+    A parsed HTTP request.
+    Instances are recycled through a per-thread free list (see
+    acquire_request/release_request) instead of allocated per request.
+    """
+
+    __slots__ = ("method", "host", "port", "raw", "buffered_body",
+                 "request_line", "content_length", "headers")
+
+    def __init__(self):
+        self.headers = {}
+
+
+def acquire_request():
+    """
+    Take a cleared Request from this thread's free list, or make one.
+
+    Returns:
+        Request: Request whose headers dict is empty
+    """
+    free = getattr(_thread_local, "free_requests", None)
+    if free:
+        return free.pop()
+    return Request()
+
+
+def release_request(request):
+    """
+    Return a Request to this thread's free list for reuse.
+    The request must not be used after it is released.
+
+    Args:
+        request: Request obtained from parse_http_request()
+    """
+    # Drop references to request bytes so they can be freed now
+    request.raw = request.buffered_body = None
+    request.headers.clear()
+
+    free = getattr(_thread_local, "free_requests", None)
+    if free is None:
+        free = _thread_local.free_requests = []
+    if len(free) < MAX_FREE_REQUESTS:
+        free.append(request)
 
 
-def parse_http_request(data):
+def _parse_target(target):
+    """
+    Extract host and port from an absolute-form request target.
+    Only the authority is memoized: the path is client-supplied and can
+    be up to MAX_HEADER_SIZE long, so keying on the whole URL would let
+    clients pin large strings in the cache.
+
+    Args:
+        target: Absolute URL, e.g. "http://example.com:8080/path"
+
+    Returns:
+        tuple: (hostname, port) where port is None if not given
+    """
+    netloc = target.split("/", 3)[2]
+    if len(netloc) > MAX_CACHED_NETLOC:
+        return _parse_netloc.__wrapped__(netloc)
+    return _parse_netloc(netloc)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_netloc(netloc):
+    """
+    Split a URL authority into host and port.
+    Memoized, since clients tend to repeat the same hosts.
+
+    Args:
+        netloc: Authority part of a URL, e.g. "example.com:8080"
+
+    Returns:
+        tuple: (hostname, port) where port is None if not given
+    """
+    parsed = urlparse("//" + netloc)
+    return parsed.hostname, parsed.port
+
+
+def parse_http_request(data, headers_end=-1):
     """
     Parse HTTP request to extract method, host, port, headers, and raw data.
 
     Args:
         data: Raw HTTP request as bytes
+        headers_end: Offset of the header terminator if already known
+                     (as returned by recv_http_request), else -1
 
     Returns:
-        dict: Parsed request with keys:
+        Request: Parsed request (release with release_request() when done)
+              with attributes:
               - method: HTTP method (GET, POST, CONNECT, etc.)
               - host: Destination hostname/IP
               - port: Destination port
-              - raw: Original request bytes
+              - raw: Original request bytes, up to the end of the headers
+              - buffered_body: Body bytes received along with the headers
               - request_line: First line of HTTP request
               - content_length: Content-Length header value (0 if not present)
-              - headers: Dictionary of HTTP headers
+              - headers: INTERESTING_HEADERS present in the request,
+                lowercased bytes names mapped to bytes values (empty
+                for CONNECT)
               Returns None if parsing fails
     """
-    try:
-        # Decode bytes to string, ignoring errors
-        request_str = data.decode("utf-8", errors="ignore")
-        lines = request_str.split("\r\n")
+    request = acquire_request()
+    if _parse_into(request, data, headers_end):
+        return request
 
-        if not lines:
-            return None
+    release_request(request)
+    return None
+
+
+def _parse_into(request, data, headers_end):
+    """
+    Fill a Request from raw request bytes.
+
+    Args:
+        request: Request to fill; its headers dict must be empty
+        data: Raw HTTP request as bytes
+        headers_end: Offset of the header terminator, or -1 if unknown
+
+    Returns:
+        bool: True if the request was parsed, False if it is invalid
+    """
+    try:
+        # Work on the raw bytes and decode only the fields actually used
+        line_end = data.find(b"\r\n")
+        if line_end < 0:
+            line_end = len(data)
 
         # Parse request line (e.g., "GET http://example.com/ HTTP/1.1")
-        request_line = lines[0].split()
+        request_line_str = data[:line_end].decode("utf-8", errors="ignore")
+        request_line = request_line_str.split()
         if len(request_line) < 2:
-            return None
+            return False
 
         method = request_line[0]
         target = request_line[1]
@@ -72,22 +221,31 @@ def parse_http_request(data):
         host = None
         port = None
         content_length = 0
-        headers = {}
-
-        # Parse headers into dictionary
-        for line in lines[1:]:
-            if not line or ":" not in line:
-                continue
-
-            key, value = line.split(":", 1)
-            key = key.strip().lower()
-            value = value.strip()
-            headers[key] = value
+        headers = request.headers
+
+        # Parse headers the proxy uses into a dictionary (bytes keys,
+        # lowercased); the rest are only forwarded as part of raw. Locate the
+        # blank line ending the headers, then split the block in one C call
+        # rather than stepping through it line by line in Python.
+        # CONNECT only needs the request line (the tunnel never looks at
+        # headers), so its headers are left unparsed.
+        if method != "CONNECT":
+            if headers_end < 0:
+                headers_end = data.find(HEADER_TERMINATOR, line_end)
+            block_end = headers_end if headers_end >= 0 else len(data)
+
+            for line in data[line_end + 2:block_end].split(b"\r\n"):
+                colon = line.find(b":")
+                if colon < 0:
+                    continue
+                key = line[:colon].lower()
+                if key in INTERESTING_HEADERS:
+                    headers[key] = line[colon + 1:].strip()
 
             # Extract Content-Length if present
-            if key == "content-length":
+            if b"content-length" in headers:
                 try:
-                    content_length = int(value)
+                    content_length = int(headers[b"content-length"])
                 except ValueError:
                     content_length = 0
 
@@ -104,8 +262,8 @@ def parse_http_request(data):
         # Handle regular HTTP requests
         else:
             # First, try to get Host header
-            if "host" in headers:
-                host = headers["host"]
+            if b"host" in headers:
+                host = headers[b"host"].decode("utf-8", errors="ignore")
                 # Remove port from host if present
                 if ":" in host:
                     host, port_str = host.split(":", 1)
@@ -116,56 +274,69 @@ def parse_http_request(data):
             # If no Host header, try parsing absolute URL from target
             if not host:
                 if target.startswith("http://") or target.startswith("https://"):
-                    parsed = urlparse(target)
-                    host = parsed.hostname
-                    port = parsed.port if parsed.port else 80
+                    host, port = _parse_target(target)
+                    port = port if port else 80
                 else:
                     # Relative URL without Host header - cannot determine host
-                    return None
+                    return False
 
         if not host:
-            return None
-
-        return {
-            "method": method,
-            "host": host,
-            "port": port,
-            "raw": data,
-            "request_line": lines[0],
-            "content_length": content_length,
-            "headers": headers
-        }
+            return False
+
+        # Split off body bytes the client sent right behind the headers
+        raw = data
+        buffered_body = b""
+        if headers_end >= 0:
+            raw = data[:headers_end + len(HEADER_TERMINATOR)]
+            buffered_body = data[headers_end + len(HEADER_TERMINATOR):]
+
+        request.method = method
+        request.host = host
+        request.port = port
+        request.raw = raw
+        request.buffered_body = buffered_body
+        request.request_line = request_line_str
+        request.content_length = content_length
+        return True
 
     except Exception:
-        return None
+        return False
 
 
-def recv_request_body(sock, content_length, buffer_size=BUFFER_SIZE):
+def recv_request_body(sock, content_length, buffer_size=BUFFER_SIZE,
+                      buffered=b""):
     """
     Receive HTTP request body based on Content-Length header.
+    Receives straight into a buffer sized from Content-Length.
+    Socket errors, including socket.timeout, propagate to the caller.
 
     Args:
         sock: Client socket
         content_length: Number of bytes to receive
         buffer_size: Size of receive buffer
+        buffered: Body bytes already received along with the headers
 
     Returns:
-        bytes: Request body data
+        bytearray: Request body data (shorter than content_length if the
+                   client stopped sending early)
     """
-    body = b""
-    remaining = content_length
-
-    while remaining > 0:
-        try:
-            chunk_size = min(buffer_size, remaining)
-            chunk = sock.recv(chunk_size)
-            if not chunk:
-                break
-            body += chunk
-            remaining -= len(chunk)
-        except Exception:
+    # Content-Length comes from the client, so don't trust it for more
+    # than MAX_BODY_PREALLOC up front; larger bodies grow as data arrives
+    buffered = buffered[:content_length]
+    body = bytearray(max(min(content_length, MAX_BODY_PREALLOC), len(buffered)))
+    body[:len(buffered)] = buffered
+    received = len(buffered)
+
+    while received < content_length:
+        if received == len(body):
+            body.extend(bytes(min(len(body), content_length - received)))
+        chunk_size = min(buffer_size, len(body) - received)
+        count = sock.recv_into(memoryview(body)[received:], chunk_size)
+        if not count:
             break
+        received += count
 
+    del body[received:]
     return body
 
 
@@ -195,3 +366,55 @@ def extract_response_status(response_data):
         pass
 
     return None
+
+
+def parse_response_framing(response_head, request_method):
+    """
+    Work out how an HTTP response is delimited and whether the server
+    will keep the connection open afterwards.
+
+    Args:
+        response_head: Response status line and headers, without the
+            terminating blank line
+        request_method: Method of the request this response answers
+
+    Returns:
+        tuple: (body_length, keep_alive) where body_length is the number
+            of body bytes following the headers, or None if the body is
+            chunked or runs until the server closes the connection
+    """
+    lines = response_head.decode("latin-1").split("\r\n")
+    status_line = lines[0].split()
+    try:
+        version = status_line[0]
+        status = int(status_line[1])
+    except (IndexError, ValueError):
+        return None, False
+
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip().lower()
+
+    # An interim 1xx response is followed by the real one; don't try to frame it
+    if status < 200:
+        return None, False
+
+    if request_method == "HEAD" or status in (204, 304):
+        body_length = 0
+    elif "transfer-encoding" in headers:
+        body_length = None
+    else:
+        try:
+            body_length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            body_length = None
+
+    connection = headers.get("connection", "")
+    if version == "HTTP/1.1":
+        keep_alive = "close" not in connection
+    else:
+        keep_alive = "keep-alive" in connection
+
+    return body_length, keep_alive and body_length is not None
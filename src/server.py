@@ -1,39 +1,215 @@
+import itertools
+import selectors
 import socket
 import threading
 import signal
 import sys
+from collections import deque
 from config import config
 from handler import handle_client
-from logger import init_logger, print_metrics_summary
+from logger import init_logger, close_logger, print_metrics_summary
 from filter import init_filter
+from forwarder import tune_socket
 
 server_socket = None
 shutdown_event = threading.Event()
-active_connections = threading.Semaphore(100) 
+executor = None
+
+# Connection limit without a semaphore: only the accept loop admits
+# connections, and workers record completions on an itertools.count
+# (next() is atomic under the GIL), so neither side takes a lock
+max_active = 100
+_admitted = 0
+_finished = itertools.count()
+_finished_reads = 0  # Each _active_connections() call advances _finished once
+
+# Stack size for worker threads. Handlers never recurse deeply, so the
+# platform default (often 8 MB) is mostly wasted address space per thread.
+WORKER_STACK_SIZE = 512 * 1024
+
+# Sent as-is to clients rejected at the connection limit
+CAPACITY_BODY = b"Proxy server at maximum capacity. Please try again later.\r\n"
+CAPACITY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: close\r\n"
+    b"\r\n" % len(CAPACITY_BODY)
+) + CAPACITY_BODY
+
+# Seconds the kernel waits for a new connection's first data before
+# handing it to accept() anyway (TCP_DEFER_ACCEPT)
+DEFER_ACCEPT_TIMEOUT = 5
+
+# Seconds shutdown waits for in-flight connections before stopping the
+# logger and printing metrics
+SHUTDOWN_TIMEOUT = 30
+
+
+class _Worker:
+    """Parking spot for one idle pool thread."""
+
+    __slots__ = ("wakeup", "task")
+
+    def __init__(self):
+        self.wakeup = threading.Lock()
+        self.wakeup.acquire()  # Held while the worker has nothing to do
+        self.task = None
+
+
+class WorkerPool:
+    """
+    Thread pool that hands each task to the most recently idle worker.
+
+    Idle workers park on a stack, so a busy server keeps reusing the same
+    few threads (whose stacks and handler state are still in CPU cache)
+    instead of rotating through every thread as a shared FIFO queue does.
+    Threads are started on demand up to max_workers; tasks submitted while
+    all of them are busy wait in a backlog.
+    """
+
+    def __init__(self, max_workers, thread_name_prefix="Worker"):
+        self._max_workers = max_workers
+        self._thread_name_prefix = thread_name_prefix
+        self._lock = threading.Lock()
+        self._idle = []  # Stack of parked _Worker, most recent last
+        self._backlog = deque()
+        self._num_threads = 0  # Started and not yet exited
+        self._threads_exited = threading.Condition(self._lock)
+        self._shutdown = False
+
+    def submit(self, fn, *args):
+        """
+        Run fn(*args) on a pool thread.
+
+        Args:
+            fn: Callable to run
+            *args: Arguments for fn
+        """
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+
+            if self._idle:
+                worker = self._idle.pop()
+                worker.task = (fn, args)
+                worker.wakeup.release()
+            elif self._num_threads < self._max_workers:
+                self._num_threads += 1
+                thread = threading.Thread(
+                    target=self._run, args=((fn, args),), daemon=True,
+                    name=f"{self._thread_name_prefix}-{self._num_threads}")
+                thread.start()
+            else:
+                self._backlog.append((fn, args))
+
+    def shutdown(self, wait=False, timeout=None):
+        """
+        Stop accepting tasks and let idle threads exit.
+        Busy threads finish their current task (and any backlog) first.
+
+        Waits on a condition rather than Thread.join(), so a signal handler
+        raising in the caller does not mark still-running threads as ended.
+
+        Args:
+            wait: If True, wait for busy threads to finish
+            timeout: Maximum seconds to wait (None for no limit)
+
+        Returns:
+            int: Number of threads still busy
+        """
+        with self._lock:
+            self._shutdown = True
+            idle, self._idle = self._idle, []
+            self._num_threads -= len(idle)  # Woken below with no task
+
+        for worker in idle:
+            worker.wakeup.release()
+
+        with self._lock:
+            if wait:
+                self._threads_exited.wait_for(lambda: not self._num_threads,
+                                              timeout)
+            return self._num_threads
+
+    def _run(self, task):
+        """Thread body: run tasks, parking on the idle stack in between."""
+        worker = _Worker()
+        while task is not None:
+            fn, args = task
+            try:
+                fn(*args)
+            except Exception:
+                pass  # Handlers deal with their own errors; keep the thread
+
+            with self._lock:
+                if self._backlog:
+                    task = self._backlog.popleft()
+                    continue
+                if self._shutdown:
+                    self._num_threads -= 1
+                    self._threads_exited.notify_all()
+                    break
+                self._idle.append(worker)
+
+            worker.wakeup.acquire()
+            task, worker.task = worker.task, None
 
 
 def signal_handler(sig, frame):
-  
+    """
+    Request shutdown on SIGINT/SIGTERM.
+    The signal also lands on the wakeup socket registered with
+    signal.set_wakeup_fd(), which wakes the accept loop to clean up.
+    A second signal stops waiting for active connections.
+    """
+    if shutdown_event.is_set():
+        raise KeyboardInterrupt
+
     print("\n[!] Shutting down proxy server...")
-    print("[*] Waiting for active connections to complete...")
+    print(f"[*] Waiting up to {SHUTDOWN_TIMEOUT}s for active connections "
+          f"to complete (signal again to stop waiting)...")
 
     shutdown_event.set()
 
-    if server_socket:
-        try:
-            server_socket.close()
-        except:
-            pass
 
-    print_metrics_summary()
+def _active_connections():
+    """
+    Number of admitted connections still being handled.
+    Only called from the accept loop.
+
+    Returns:
+        int: Admitted minus finished connections
+    """
+    global _finished_reads
+
+    # Reading an itertools.count advances it, so subtract earlier reads
+    finished = next(_finished) - _finished_reads
+    _finished_reads += 1
+    return _admitted - finished
+
+
+def reject_connection(client_sock):
+    """
+    Answer a connection over the limit with 503 and close it.
+    Runs on the accept loop, so it never blocks: the response is a single
+    small write that fits in an empty socket send buffer.
 
-    print("[+] Shutdown complete")
-    sys.exit(0)
+    Args:
+        client_sock: Newly accepted client socket
+    """
+    try:
+        client_sock.setblocking(False)
+        client_sock.send(CAPACITY_RESPONSE)
+    except OSError:
+        pass
+    finally:
+        client_sock.close()
 
 
 def handle_client_wrapper(client_sock, client_addr, cfg):
     """
-    Wrapper for handle_client that manages connection semaphore.
+    Wrapper for handle_client that records the connection as finished.
 
     Args:
         client_sock: Client socket
@@ -43,7 +219,7 @@ def handle_client_wrapper(client_sock, client_addr, cfg):
     try:
         handle_client(client_sock, client_addr, cfg)
     finally:
-        active_connections.release()
+        next(_finished)
 
 
 def start_server():
@@ -54,17 +230,18 @@ def start_server():
         - Reads settings from config/proxy_config.ini
         - Listens on configured host:port
         - SO_REUSEADDR enabled for quick restarts
-        - Spawns daemon thread for each client
+        - Hands each client to a worker thread pool
         - Implements graceful shutdown on SIGINT/SIGTERM
         - Enforces max connection limit if configured
 
     Threading Model:
-        - Main thread runs accept loop
-        - Each client connection handled in separate daemon thread
-        - Daemon threads automatically terminate when main exits
-        - Semaphore controls max concurrent connections
+        - Main thread waits on a selector and accepts all pending clients
+        - Each client connection handled by a pooled worker thread
+        - Worker threads are reused across connections, most recently
+          idle first (LIFO)
+        - Admitted/finished counters cap concurrent connections
     """
-    global server_socket, active_connections
+    global server_socket, executor, max_active, _admitted
 
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
@@ -77,16 +254,29 @@ def start_server():
     init_filter(config)
 
     if config.max_connections > 0:
-        active_connections = threading.Semaphore(config.max_connections)
+        max_workers = config.max_connections
         print(f"[+] Max concurrent connections: {config.max_connections}")
     else:
-        active_connections = threading.Semaphore(10000)
+        max_workers = 10000
         print(f"[+] Max concurrent connections: Unlimited")
 
+    max_active = max_workers
+    try:
+        threading.stack_size(WORKER_STACK_SIZE)
+    except (ValueError, RuntimeError):
+        pass  # Platform does not support changing the stack size
+    executor = WorkerPool(max_workers, thread_name_prefix="Client")
+
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
+    # Linux: have the kernel hold new connections until the client's first
+    # bytes arrive, so accept() hands over a socket that is already readable
+    if hasattr(socket, "TCP_DEFER_ACCEPT"):
+        server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT,
+                                 DEFER_ACCEPT_TIMEOUT)
+
     try:
         server_socket.bind((config.host, config.port))
     except OSError as e:
@@ -100,42 +290,39 @@ def start_server():
     print(f"[+] Proxy listening on {config.host}:{config.port}")
     print(f"[+] Press Ctrl+C to stop server and view metrics\n")
 
-    connection_count = 0
+    # Wait for connections with a selector (epoll on Linux) and drain every
+    # pending connection per wakeup instead of one blocking accept() at a time.
+    # Signals are written to a wakeup socket watched by the same selector,
+    # so the loop blocks until there is work or shutdown is requested.
+    server_socket.setblocking(False)
+    wakeup_r, wakeup_w = socket.socketpair()
+    wakeup_r.setblocking(False)
+    wakeup_w.setblocking(False)
+    signal.set_wakeup_fd(wakeup_w.fileno())
+    selector = selectors.DefaultSelector()
+    selector.register(server_socket, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
 
     try:
         while not shutdown_event.is_set():
             try:
-                server_socket.settimeout(1.0)
-
-                try:
-                    client_sock, client_addr = server_socket.accept()
-                    connection_count += 1
-
-                    if active_connections.acquire(blocking=False):
-                        client_thread = threading.Thread(
-                            target=handle_client_wrapper,
-                            args=(client_sock, client_addr, config),
-                            name=f"Client-{connection_count}"
-                        )
-                        client_thread.daemon = True
-                        client_thread.start()
+                events = selector.select()
+                if any(key.fileobj is wakeup_r for key, _ in events):
+                    break  # Woken by a signal
+
+                while True:
+                    try:
+                        client_sock, client_addr = server_socket.accept()
+                    except BlockingIOError:
+                        break
+
+                    if _active_connections() < max_active:
+                        _admitted += 1
+                        tune_socket(client_sock, config)
+                        executor.submit(handle_client_wrapper, client_sock,
+                                        client_addr, config)
                     else:
-                        try:
-                            error_msg = (
-                                b"HTTP/1.1 503 Service Unavailable\r\n"
-                                b"Content-Type: text/plain\r\n"
-                                b"Connection: close\r\n"
-                                b"\r\n"
-                                b"Proxy server at maximum capacity. Please try again later.\r\n"
-                            )
-                            client_sock.sendall(error_msg)
-                        except:
-                            pass
-                        finally:
-                            client_sock.close()
-
-                except socket.timeout:
-                    continue
+                        reject_connection(client_sock)
 
             except OSError:
                 break
@@ -143,9 +330,28 @@ def start_server():
     except KeyboardInterrupt:
         pass
     finally:
+        signal.set_wakeup_fd(-1)
+        selector.close()
+        wakeup_r.close()
+        wakeup_w.close()
         if server_socket:
             server_socket.close()
+        if executor:
+            # Let in-flight connections log and count their bytes before
+            # the logger stops and the summary is printed. Workers are
+            # daemon threads, so any still running do not keep the
+            # process alive past this point.
+            try:
+                still_running = executor.shutdown(wait=True,
+                                                  timeout=SHUTDOWN_TIMEOUT)
+            except KeyboardInterrupt:
+                still_running = executor.shutdown()
+            if still_running:
+                print(f"[!] Exiting with {still_running} connection(s) "
+                      f"still active; they are not logged or counted")
+        close_logger()
         print_metrics_summary()
+        print("[+] Shutdown complete")
 
 
 if __name__ == "__main__":
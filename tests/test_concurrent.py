@@ -4,19 +4,14 @@ Concurrent connection test for the proxy server.
 Tests the proxy's ability to handle multiple simultaneous requests.
 """
 
-import requests
-import threading
+import asyncio
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import httpx
 
 PROXY_URL = "http://localhost:8888"
 NUM_CONCURRENT = 20
-NUM_REQUESTS_PER_THREAD = 5
-
-proxies = {
-    'http': PROXY_URL,
-    'https': PROXY_URL,
-}
+NUM_REQUESTS_PER_WORKER = 5
 
 results = {
     'success': 0,
@@ -24,48 +19,44 @@ results = {
     'total_time': 0
 }
 
-results_lock = threading.Lock()
 
-
-def make_request(thread_id, request_id):
+async def make_request(client, worker_id, request_id):
     """
     Make a single HTTP request through the proxy.
 
     Args:
-        thread_id: Thread identifier
-        request_id: Request identifier within thread
+        client: Shared httpx.AsyncClient routed through the proxy
+        worker_id: Worker identifier
+        request_id: Request identifier within worker
 
     Returns:
         tuple: (success, elapsed_time)
     """
     start_time = time.time()
     try:
-        response = requests.get(
-            'http://httpbin.org/delay/1',
-            proxies=proxies,
-            timeout=10
-        )
+        response = await client.get('http://httpbin.org/delay/1')
         elapsed = time.time() - start_time
 
         if response.status_code == 200:
             return True, elapsed
         else:
-            print(f"[Thread {thread_id}, Request {request_id}] "
+            print(f"[Worker {worker_id}, Request {request_id}] "
                   f"HTTP {response.status_code}")
             return False, elapsed
 
     except Exception as e:
         elapsed = time.time() - start_time
-        print(f"[Thread {thread_id}, Request {request_id}] Error: {e}")
+        print(f"[Worker {worker_id}, Request {request_id}] Error: {e}")
         return False, elapsed
 
 
-def worker(thread_id):
+async def worker(client, worker_id):
     """
-    Worker function that makes multiple requests.
+    Worker coroutine that makes multiple requests in sequence.
 
     Args:
-        thread_id: Thread identifier
+        client: Shared httpx.AsyncClient routed through the proxy
+        worker_id: Worker identifier
 
     Returns:
         tuple: (successes, failures, total_time)
@@ -74,8 +65,8 @@ def worker(thread_id):
     failures = 0
     total_time = 0
 
-    for i in range(NUM_REQUESTS_PER_THREAD):
-        success, elapsed = make_request(thread_id, i + 1)
+    for i in range(NUM_REQUESTS_PER_WORKER):
+        success, elapsed = await make_request(client, worker_id, i + 1)
         if success:
             successes += 1
         else:
@@ -85,31 +76,43 @@ def worker(thread_id):
     return successes, failures, total_time
 
 
+async def run_workers():
+    """
+    Run NUM_CONCURRENT workers on one event loop, sharing one client.
+    The proxy closes each client connection after one request, so the
+    client opens a new connection to the proxy for every request; the
+    limit only caps how many are open at once.
+
+    Returns:
+        list: (successes, failures, total_time) per worker
+    """
+    limits = httpx.Limits(max_connections=NUM_CONCURRENT)
+    async with httpx.AsyncClient(proxy=PROXY_URL, limits=limits,
+                                 timeout=10) as client:
+        return await asyncio.gather(
+            *(worker(client, i) for i in range(NUM_CONCURRENT)))
+
+
 def main():
     """Run concurrent proxy tests."""
     print("=" * 60)
     print("Custom Network Proxy Server - Concurrent Connection Test")
     print("=" * 60)
     print(f"Proxy: {PROXY_URL}")
-    print(f"Concurrent threads: {NUM_CONCURRENT}")
-    print(f"Requests per thread: {NUM_REQUESTS_PER_THREAD}")
-    print(f"Total requests: {NUM_CONCURRENT * NUM_REQUESTS_PER_THREAD}")
+    print(f"Concurrent workers: {NUM_CONCURRENT}")
+    print(f"Requests per worker: {NUM_REQUESTS_PER_WORKER}")
+    print(f"Total requests: {NUM_CONCURRENT * NUM_REQUESTS_PER_WORKER}")
     print("=" * 60)
     print("")
 
     print("Starting concurrent requests...")
     start_time = time.time()
 
-    # Use ThreadPoolExecutor for concurrent requests
-    with ThreadPoolExecutor(max_workers=NUM_CONCURRENT) as executor:
-        futures = [executor.submit(worker, i) for i in range(NUM_CONCURRENT)]
-
-        for future in as_completed(futures):
-            successes, failures, thread_time = future.result()
-            with results_lock:
-                results['success'] += successes
-                results['failed'] += failures
-                results['total_time'] += thread_time
+    # Run all workers concurrently on a single event loop
+    for successes, failures, worker_time in asyncio.run(run_workers()):
+        results['success'] += successes
+        results['failed'] += failures
+        results['total_time'] += worker_time
 
     total_elapsed = time.time() - start_time
 